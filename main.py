@@ -3,7 +3,16 @@
 MCP Server with Git operations (add, commit, push) using FastMCP
 """
 
-import subprocess
+import asyncio
+import functools
+import os
+import platform
+import re
+import shlex
+import shutil
+import signal
+import sys
+import time
 from pathlib import Path
 from typing import Optional
 
@@ -12,8 +21,295 @@ from fastmcp import FastMCP
 # Initialize the MCP server
 mcp = FastMCP("Git Operations Server")
 
+# Prebuilt responses for errors whose message never changes
+_ERR_NOTHING_TO_ADD = {"status": "error", "message": "Must specify either files, all_files=True, interactive=True, or patch=True"}
+_ERR_ADD_TIMEOUT = {"status": "error", "message": "Git add command timed out after 30 seconds"}
+_ERR_EMPTY_MESSAGE = {"status": "error", "message": "Commit message cannot be empty"}
+_ERR_COMMIT_TIMEOUT = {"status": "error", "message": "Git commit command timed out after 30 seconds"}
+_ERR_NO_BRANCH = {"status": "error", "message": "Could not determine current branch"}
+_ERR_PUSH_TIMEOUT = {"status": "error", "message": "Git push command timed out after 2 minutes"}
+_ERR_STATUS_TIMEOUT = {"status": "error", "message": "Git status command timed out"}
+# Fixed argv prefixes for each tool, picked by the flags that select them
+_GIT_ADD = ("git", "add")
+_GIT_ADD_ALL = ("git", "add", ".")
+_GIT_ADD_INTERACTIVE = ("git", "add", "--interactive")
+_GIT_ADD_PATCH = ("git", "add", "--patch")
+_GIT_SHOW_CURRENT_BRANCH = ("git", "branch", "--show-current")
+_GIT_STATUS = ("git", "status", "--porcelain=v2", "-z", "--branch")
+# Keyed by (amend, all_files); the commit message follows "-m"
+_GIT_COMMIT = {
+    (False, False): ("git", "commit", "-m"),
+    (False, True): ("git", "commit", "-a", "-m"),
+    (True, False): ("git", "commit", "--amend", "-m"),
+    (True, True): ("git", "commit", "--amend", "-a", "-m"),
+}
+# Keyed by (force, set_upstream); the remote and branch follow
+_GIT_PUSH = {
+    (False, False): ("git", "push"),
+    (False, True): ("git", "push", "-u"),
+    (True, False): ("git", "push", "--force"),
+    (True, True): ("git", "push", "--force", "-u"),
+}
+
+# Absolute path to git, looked up once so each spawn skips the PATH search
+GIT_EXECUTABLE = shutil.which("git") or "git"
+
+
+async def _spawn_git(*args: str, repo_path: Path) -> asyncio.subprocess.Process:
+    """
+    Start `git <args>` in `repo_path` with stdout and stderr captured.
+    
+    git leads its own session so that it can be killed together with the hooks, ssh
+    and credential helpers it starts, which would otherwise keep its pipes open.
+    """
+    return await asyncio.create_subprocess_exec(
+        GIT_EXECUTABLE, *args,
+        cwd=repo_path,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True
+    )
+
+
+def _kill_git(proc: asyncio.subprocess.Process) -> None:
+    """Kill git and every process in its group."""
+    if os.name != "posix":
+        if proc.returncode is None:
+            proc.kill()
+        return
+    try:
+        # Hooks may outlive git itself, so signal the group even if git has exited
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+# Successful pushes only report the end of git's stderr, where the ref summary is
+PUSH_OUTPUT_TAIL = 4096
+
+
+def _output_tail(output: bytes, limit: int = PUSH_OUTPUT_TAIL) -> str:
+    """Decode at most the last `limit` bytes of `output`, starting on a line boundary."""
+    output = output.strip()
+    if len(output) > limit:
+        tail = output[-limit:]
+        output = tail.partition(b"\n")[2] or tail
+    return output.decode("utf-8", "replace")
+
+
+# Seconds to wait for a killed git to be reaped before giving up on it
+REAP_TIMEOUT = 1.0
+
+
+async def _communicate(proc: asyncio.subprocess.Process, timeout: float) -> tuple[bytes, bytes]:
+    """
+    Collect the output of `proc`, bounded by a single `asyncio.wait_for`.
+    
+    On timeout, cancellation (e.g. a disconnected client) or any other error git and
+    its child processes are killed and reaped before the exception propagates.
+    """
+    try:
+        return await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except BaseException:
+        _kill_git(proc)
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=REAP_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass  # A descendant that left git's session still holds the pipes
+        raise
+
+
+async def _exec_git(cmd: tuple[str, ...], repo_path: Path, timeout: float) -> tuple[int, bytes, bytes]:
+    """Run `cmd` (starting with "git") in `repo_path` and return (returncode, stdout, stderr)."""
+    proc = await _spawn_git(*cmd[1:], repo_path=repo_path)
+    stdout, stderr = await _communicate(proc, timeout=timeout)
+    return proc.returncode, stdout, stderr
+
+
+async def _run_git(
+    cmd: tuple[str, ...],
+    repo_path: Path,
+    success_message: str,
+    failure_message: str,
+    timeout: float = 30,
+    empty_stdout: str = "",
+    success_stderr: bool = False
+) -> dict:
+    """
+    Run a git command and build the success or error response shared by the tools.
+    
+    Successful responses carry stdout (or `empty_stdout` if there was none) and, with
+    `success_stderr`, the tail of stderr. Error responses carry the full stderr.
+    Timeouts propagate as `asyncio.TimeoutError` for the tool to report.
+    """
+    returncode, stdout, stderr = await _exec_git(cmd, repo_path, timeout)
+    
+    if returncode == 0:
+        response = {
+            "status": "success",
+            "message": success_message,
+            "command": shlex.join(cmd),
+            "stdout": stdout.strip().decode() or empty_stdout
+        }
+        if success_stderr:
+            response["stderr"] = _output_tail(stderr)
+        response["repository_path"] = str(repo_path)
+        return response
+    
+    return {
+        "status": "error",
+        "message": failure_message,
+        "command": shlex.join(cmd),
+        "stderr": stderr.strip().decode(),
+        "repository_path": str(repo_path)
+    }
+
+
+# Repository lookups are cached for this many seconds so removed repos are eventually noticed
+REPO_CACHE_TTL = 5.0
+
+
+@functools.lru_cache(maxsize=256)
+def _resolve_repo(repository_path: str, ttl_bucket: int) -> Path:
+    # Absolute paths without ".." are already canonical enough to use as given, which
+    # skips resolve()'s per-component readlink; Path itself folds "//" and "/./"
+    if os.path.isabs(repository_path) and "/.." not in repository_path:
+        return Path(repository_path)
+    return Path(repository_path).resolve()
+
+
+@functools.lru_cache(maxsize=256)
+def _is_git_repo(repo_str: str, ttl_bucket: int) -> Optional[bool]:
+    """
+    Check for a git repository at `repo_str` with a single stat of its .git entry.
+    
+    Returns:
+        True for a git repository, False if the path exists but is not one, or None
+        if the path does not exist
+    """
+    try:
+        # .git is a directory in a normal checkout and a file in worktrees and submodules
+        os.stat(os.path.join(repo_str, ".git"))
+        return True
+    except NotADirectoryError:
+        return False  # The path is a regular file
+    except FileNotFoundError:
+        # Only the failure path pays for a second stat to tell the two errors apart
+        return False if os.path.exists(repo_str) else None
+
+
+def _check_repo(repository_path: Optional[str]) -> tuple[Optional[Path], Optional[dict]]:
+    """
+    Resolve the repository a tool should run in.
+    
+    Returns:
+        Tuple of (repo_path, error) where error is an error response dict or None
+    """
+    ttl_bucket = int(time.monotonic() // REPO_CACHE_TTL)
+    
+    # Set working directory
+    if repository_path:
+        repo_path = _resolve_repo(repository_path, ttl_bucket)
+    else:
+        repo_path = Path.cwd()
+    
+    # Check if it's a git repository
+    is_repo = _is_git_repo(str(repo_path), ttl_bucket)
+    if is_repo is None:
+        return None, {
+            "status": "error",
+            "message": f"Repository path does not exist: {repository_path}"
+        }
+    if not is_repo:
+        return repo_path, {
+            "status": "error",
+            "message": f"Not a git repository: {repo_path}"
+        }
+    
+    return repo_path, None
+
+
+def _parse_porcelain_v2(output: bytes) -> dict:
+    """
+    Parse `git status --porcelain=v2 -z --branch` output.
+    
+    Returns:
+        Dictionary with head, branch, upstream, ahead, behind and files, where each
+        file is a dict with xy, path and orig_path (set for renames and copies)
+    """
+    status = {"head": None, "branch": None, "upstream": None, "ahead": None, "behind": None}
+    files = []
+    entries = iter(output.split(b"\0"))
+    
+    for entry in entries:
+        if not entry:
+            continue
+        kind = entry[:1]
+        
+        if kind == b"#":
+            # Branch headers, e.g. "# branch.oid <sha>" or "# branch.ab +1 -2"
+            _, key, value = entry.decode("utf-8", "replace").split(" ", 2)
+            if key == "branch.oid":
+                status["head"] = None if value == "(initial)" else value
+            elif key == "branch.head":
+                status["branch"] = None if value == "(detached)" else value
+            elif key == "branch.upstream":
+                status["upstream"] = value
+            elif key == "branch.ab":
+                ahead, behind = value.split()
+                status["ahead"], status["behind"] = int(ahead), -int(behind)
+            continue
+        
+        orig_path = None
+        if kind == b"1":
+            fields = entry.split(b" ", 8)
+            xy, path = fields[1], fields[8]
+        elif kind == b"2":
+            # Renames and copies carry their original path as the next entry
+            fields = entry.split(b" ", 9)
+            xy, path = fields[1], fields[9]
+            orig_path = next(entries, b"").decode("utf-8", "replace")
+        elif kind == b"u":
+            fields = entry.split(b" ", 10)
+            xy, path = fields[1], fields[10]
+        else:
+            # Untracked ("?") and ignored ("!") entries are just "<kind> <path>"
+            xy, path = kind * 2, entry[2:]
+        
+        files.append({
+            "xy": xy.decode(),
+            "path": path.decode("utf-8", "replace"),
+            "orig_path": orig_path
+        })
+    
+    status["files"] = files
+    return status
+
+
+def _read_head_branch(repo_path: Path) -> Optional[str]:
+    """
+    Read the current branch name straight from .git/HEAD.
+    
+    Returns:
+        The branch name, "" for a detached HEAD, or None if HEAD cannot be read this
+        way (.git is a file, or the repository stores refs in reftable)
+    """
+    try:
+        with open(os.path.join(str(repo_path), ".git", "HEAD")) as head_file:
+            head = head_file.read().strip()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    
+    if head.startswith("ref: refs/heads/"):
+        branch = head[len("ref: refs/heads/"):]
+        # Reftable repositories keep a fixed "refs/heads/.invalid" stub in .git/HEAD;
+        # no real branch can have that name
+        return None if branch == ".invalid" else branch
+    return ""
+
+
 @mcp.tool()
-def git_add(
+async def git_add(
     files: Optional[str] = None,
     all_files: bool = False,
     interactive: bool = False,
@@ -35,74 +331,35 @@ def git_add(
     """
     
     try:
-        # Set working directory
-        if repository_path:
-            repo_path = Path(repository_path).resolve()
-            if not repo_path.exists():
-                return {
-                    "status": "error",
-                    "message": f"Repository path does not exist: {repository_path}"
-                }
-        else:
-            repo_path = Path.cwd()
-        
-        # Check if it's a git repository
-        if not (repo_path / ".git").exists():
-            return {
-                "status": "error",
-                "message": f"Not a git repository: {repo_path}"
-            }
+        # Resolve and validate the repository
+        repo_path, error = _check_repo(repository_path)
+        if error:
+            return error
         
         # Build git add command
-        cmd = ["git", "add"]
-        
         if interactive:
-            cmd.append("--interactive")
+            cmd = _GIT_ADD_INTERACTIVE
         elif patch:
-            cmd.append("--patch")
+            cmd = _GIT_ADD_PATCH
         elif all_files:
-            cmd.append(".")
+            cmd = _GIT_ADD_ALL
         elif files:
             # Split files string and add each file
             file_list = files.strip().split()
-            cmd.extend(file_list)
+            cmd = _GIT_ADD + tuple(file_list)
         else:
-            return {
-                "status": "error",
-                "message": "Must specify either files, all_files=True, interactive=True, or patch=True"
-            }
+            return _ERR_NOTHING_TO_ADD
         
         # Execute the git add command
-        result = subprocess.run(
-            cmd,
-            cwd=repo_path,
-            capture_output=True,
-            text=True,
-            timeout=30
+        return await _run_git(
+            cmd, repo_path,
+            "Files successfully added to staging area",
+            "Git add command failed",
+            empty_stdout="No output"
         )
-        
-        if result.returncode == 0:
-            return {
-                "status": "success",
-                "message": "Files successfully added to staging area",
-                "command": " ".join(cmd),
-                "stdout": result.stdout.strip() if result.stdout.strip() else "No output",
-                "repository_path": str(repo_path)
-            }
-        else:
-            return {
-                "status": "error",
-                "message": "Git add command failed",
-                "command": " ".join(cmd),
-                "stderr": result.stderr.strip(),
-                "repository_path": str(repo_path)
-            }
     
-    except subprocess.TimeoutExpired:
-        return {
-            "status": "error",
-            "message": "Git add command timed out after 30 seconds"
-        }
+    except asyncio.TimeoutError:
+        return _ERR_ADD_TIMEOUT
     except Exception as e:
         return {
             "status": "error",
@@ -110,7 +367,7 @@ def git_add(
         }
 
 @mcp.tool()
-def git_commit(
+async def git_commit(
     message: str,
     all_files: bool = False,
     amend: bool = False,
@@ -131,69 +388,25 @@ def git_commit(
     
     try:
         if not message.strip():
-            return {
-                "status": "error",
-                "message": "Commit message cannot be empty"
-            }
+            return _ERR_EMPTY_MESSAGE
         
-        # Set working directory
-        if repository_path:
-            repo_path = Path(repository_path).resolve()
-            if not repo_path.exists():
-                return {
-                    "status": "error",
-                    "message": f"Repository path does not exist: {repository_path}"
-                }
-        else:
-            repo_path = Path.cwd()
-        
-        # Check if it's a git repository
-        if not (repo_path / ".git").exists():
-            return {
-                "status": "error",
-                "message": f"Not a git repository: {repo_path}"
-            }
+        # Resolve and validate the repository
+        repo_path, error = _check_repo(repository_path)
+        if error:
+            return error
         
         # Build git commit command
-        cmd = ["git", "commit", "-m", message]
-        
-        if all_files:
-            cmd.insert(2, "-a")  # Insert after "git commit"
-        
-        if amend:
-            cmd.insert(2, "--amend")
+        cmd = _GIT_COMMIT[amend, all_files] + (message,)
         
         # Execute the git commit command
-        result = subprocess.run(
-            cmd,
-            cwd=repo_path,
-            capture_output=True,
-            text=True,
-            timeout=30
+        return await _run_git(
+            cmd, repo_path,
+            "Commit created successfully",
+            "Git commit command failed"
         )
-        
-        if result.returncode == 0:
-            return {
-                "status": "success",
-                "message": "Commit created successfully",
-                "command": " ".join(cmd),
-                "stdout": result.stdout.strip(),
-                "repository_path": str(repo_path)
-            }
-        else:
-            return {
-                "status": "error",
-                "message": "Git commit command failed",
-                "command": " ".join(cmd),
-                "stderr": result.stderr.strip(),
-                "repository_path": str(repo_path)
-            }
     
-    except subprocess.TimeoutExpired:
-        return {
-            "status": "error",
-            "message": "Git commit command timed out after 30 seconds"
-        }
+    except asyncio.TimeoutError:
+        return _ERR_COMMIT_TIMEOUT
     except Exception as e:
         return {
             "status": "error",
@@ -201,7 +414,7 @@ def git_commit(
         }
 
 @mcp.tool()
-def git_push(
+async def git_push(
     remote: str = "origin",
     branch: Optional[str] = None,
     force: bool = False,
@@ -223,91 +436,44 @@ def git_push(
     """
     
     try:
-        # Set working directory
-        if repository_path:
-            repo_path = Path(repository_path).resolve()
-            if not repo_path.exists():
-                return {
-                    "status": "error",
-                    "message": f"Repository path does not exist: {repository_path}"
-                }
-        else:
-            repo_path = Path.cwd()
-        
-        # Check if it's a git repository
-        if not (repo_path / ".git").exists():
-            return {
-                "status": "error",
-                "message": f"Not a git repository: {repo_path}"
-            }
+        # Resolve and validate the repository
+        repo_path, error = _check_repo(repository_path)
+        if error:
+            return error
         
         # Get current branch if no branch specified
         if branch is None:
-            branch_result = subprocess.run(
-                ["git", "branch", "--show-current"],
-                cwd=repo_path,
-                capture_output=True,
-                text=True,
-                timeout=10
+            branch = _read_head_branch(repo_path)
+        if branch is None:
+            # HEAD is not a plain file (worktree, submodule or reftable), so ask git
+            returncode, branch_stdout, branch_stderr = await _exec_git(
+                _GIT_SHOW_CURRENT_BRANCH, repo_path, timeout=10
             )
             
-            if branch_result.returncode == 0:
-                branch = branch_result.stdout.strip()
-                if not branch:
-                    return {
-                        "status": "error",
-                        "message": "Could not determine current branch"
-                    }
-            else:
+            if returncode != 0:
                 return {
                     "status": "error",
                     "message": "Failed to get current branch",
-                    "stderr": branch_result.stderr.strip()
+                    "stderr": branch_stderr.strip().decode()
                 }
+            branch = branch_stdout.strip().decode()
+        if not branch:
+            return _ERR_NO_BRANCH
         
         # Build git push command
-        cmd = ["git", "push"]
-        
-        if set_upstream:
-            cmd.extend(["-u", remote, branch])
-        else:
-            cmd.extend([remote, branch])
-        
-        if force:
-            cmd.insert(2, "--force")  # Insert after "git push"
+        cmd = _GIT_PUSH[force, set_upstream] + (remote, branch)
         
-        # Execute the git push command
-        result = subprocess.run(
-            cmd,
-            cwd=repo_path,
-            capture_output=True,
-            text=True,
-            timeout=120  # Longer timeout for push operations
+        # Execute the git push command; push info often goes to stderr
+        return await _run_git(
+            cmd, repo_path,
+            f"Successfully pushed to {remote}/{branch}",
+            f"Git push to {remote}/{branch} failed",
+            timeout=120,  # Longer timeout for push operations
+            success_stderr=True
         )
-        
-        if result.returncode == 0:
-            return {
-                "status": "success",
-                "message": f"Successfully pushed to {remote}/{branch}",
-                "command": " ".join(cmd),
-                "stdout": result.stdout.strip(),
-                "stderr": result.stderr.strip(),  # Push info often goes to stderr
-                "repository_path": str(repo_path)
-            }
-        else:
-            return {
-                "status": "error",
-                "message": f"Git push to {remote}/{branch} failed",
-                "command": " ".join(cmd),
-                "stderr": result.stderr.strip(),
-                "repository_path": str(repo_path)
-            }
     
-    except subprocess.TimeoutExpired:
-        return {
-            "status": "error",
-            "message": "Git push command timed out after 2 minutes"
-        }
+    except asyncio.TimeoutError:
+        return _ERR_PUSH_TIMEOUT
     except Exception as e:
         return {
             "status": "error",
@@ -315,7 +481,7 @@ def git_push(
         }
 
 @mcp.tool()
-def git_status(repository_path: Optional[str] = None) -> dict:
+async def git_status(repository_path: Optional[str] = None) -> dict:
     """
     Get the current git status to see what files can be added.
     
@@ -323,62 +489,103 @@ def git_status(repository_path: Optional[str] = None) -> dict:
         repository_path: Path to the git repository (defaults to current directory)
     
     Returns:
-        Dictionary with git status information
+        Dictionary with git status information: head, branch, upstream, ahead/behind
+        counts and a list of files with their porcelain v2 XY status
+    """
+    
+    return await _git_status(repository_path)
+
+@mcp.tool()
+async def git_status_many(repository_paths: list[str]) -> dict:
     """
+    Get the git status of several repositories concurrently.
+    
+    Args:
+        repository_paths: Paths to the git repositories
+    
+    Returns:
+        Dictionary with one git_status result per repository, in the given order
+    """
+    
+    # Bound the number of git processes running at once
+    limit = asyncio.Semaphore((os.cpu_count() or 1) * 2)
+    
+    async def status_one(path: str) -> dict:
+        async with limit:
+            return await _git_status(path)
+    
+    results = await asyncio.gather(
+        *(status_one(path) for path in repository_paths),
+        return_exceptions=True
+    )
+    return {
+        "status": "success",
+        "message": f"Git status retrieved for {len(results)} repositories",
+        "results": [
+            {"status": "error", "message": f"Unexpected error: {str(r)}"}
+            if isinstance(r, BaseException) else r
+            for r in results
+        ]
+    }
+
+async def _git_status(repository_path: Optional[str]) -> dict:
+    """Shared implementation of git_status and git_status_many."""
     
     try:
-        # Set working directory
-        if repository_path:
-            repo_path = Path(repository_path).resolve()
-            if not repo_path.exists():
-                return {
-                    "status": "error",
-                    "message": f"Repository path does not exist: {repository_path}"
-                }
-        else:
-            repo_path = Path.cwd()
-        
-        # Check if it's a git repository
-        if not (repo_path / ".git").exists():
-            return {
-                "status": "error",
-                "message": f"Not a git repository: {repo_path}"
-            }
+        # Resolve and validate the repository
+        repo_path, error = _check_repo(repository_path)
+        if error:
+            return error
         
         # Get git status
-        result = subprocess.run(
-            ["git", "status", "--porcelain"],
-            cwd=repo_path,
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
+        returncode, stdout, stderr = await _exec_git(_GIT_STATUS, repo_path, timeout=10)
         
-        if result.returncode == 0:
+        if returncode == 0:
             return {
                 "status": "success",
                 "repository_path": str(repo_path),
-                "porcelain_output": result.stdout.strip(),
+                **_parse_porcelain_v2(stdout),
                 "message": "Git status retrieved successfully"
             }
         else:
             return {
                 "status": "error",
                 "message": "Git status command failed",
-                "stderr": result.stderr.strip()
+                "stderr": stderr.strip().decode()
             }
     
-    except subprocess.TimeoutExpired:
-        return {
-            "status": "error",
-            "message": "Git status command timed out"
-        }
+    except asyncio.TimeoutError:
+        return _ERR_STATUS_TIMEOUT
     except Exception as e:
         return {
             "status": "error",
             "message": f"Unexpected error: {str(e)}"
         }
 
+def _install_event_loop_policy() -> None:
+    """
+    Use the io_uring event loop from uringcore when it is installed and the kernel
+    supports it, falling back to uvloop, then to the default asyncio loop.
+    """
+    if sys.platform == "linux":
+        kernel = re.match(r"(\d+)\.(\d+)", platform.release())
+        if kernel and (int(kernel[1]), int(kernel[2])) >= (5, 11):
+            try:
+                import uringcore
+            except ImportError:
+                pass
+            else:
+                asyncio.set_event_loop_policy(uringcore.EventLoopPolicy())
+                return
+    
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
 if __name__ == "__main__":
+    _install_event_loop_policy()
+    
     # Run the MCP server
     mcp.run(transport="http", host="0.0.0.0", port=5001)
\ No newline at end of file